@@ -1,15 +1,24 @@
 from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import JSONResponse, Response
 from models import *
 
 app = FastAPI(title='DBMS')
 
 databases: dict[str, Database] = {}
+_database_names: Optional[list[str]] = None
 
 
 class HTTPError(BaseModel):
     detail: str
 
 
+class PydanticResponse(JSONResponse):
+    def render(self, content: BaseModel) -> bytes:
+        if isinstance(content, Row):
+            return content.dump_json()
+        return content.model_dump_json(exclude_none=True).encode()
+
+
 def response(description, example=None, **examples):
     assert (not example) != (not examples)
     result = {
@@ -34,19 +43,51 @@ def response(description, example=None, **examples):
     }
 
 
+DATABASE_NOT_FOUND = response("Database was not found", "Cannot find database 'database_name'")
+TABLE_NOT_FOUND = response("Database or table was not found",
+                           database_not_found="Cannot find database 'database_name'",
+                           table_not_found="Database 'database_name' doesn't contain table #table_id")
+ROW_NOT_FOUND = response("Database, table or row was not found",
+                         database_not_found="Cannot find database 'database_name'",
+                         table_not_found="Database 'database_name' doesn't contain table #table_id",
+                         row_not_found="Table #table_id in database 'database_name' doesn't contain row #row_id")
+
+
+def _resolve(database_name: str,
+             table_id: Optional[NonNegativeInt] = None,
+             row_id: Optional[NonNegativeInt] = None) -> tuple[Database, Optional[Table], Optional[Row]]:
+    database = databases.get(database_name)
+    if database is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Cannot find database '{database_name}'")
+    if table_id is None:
+        return database, None, None
+    table = database.tables.get(table_id)
+    if table is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Database '{database_name}' doesn't contain table #{table_id}")
+    if row_id is None:
+        return database, table, None
+    row = table.get_row(row_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Table #{table_id} in database '{database_name}' doesn't contain row #{row_id}")
+    return database, table, row
+
+
 @app.get('/databases')
-def get_databases() -> list[str]:
-    return list(databases)
+async def get_databases() -> list[str]:
+    global _database_names
+    if _database_names is None:
+        _database_names = list(databases)
+    return _database_names
 
 
-@app.get('/databases/{database_name}', response_model_exclude_none=True, responses={
-    status.HTTP_404_NOT_FOUND: response("Database was not found", "Cannot find database 'database_name'"),
+@app.get('/databases/{database_name}', response_model=Database, responses={
+    status.HTTP_404_NOT_FOUND: DATABASE_NOT_FOUND,
 })
-def get_database(database_name: str) -> Database:
-    try:
-        return databases[database_name]
-    except KeyError:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Cannot find database '{database_name}'")
+async def get_database(database_name: str) -> PydanticResponse:
+    database, _, _ = _resolve(database_name)
+    return PydanticResponse(database)
 
 
 class NewDatabase(BaseModel):
@@ -56,35 +97,33 @@ class NewDatabase(BaseModel):
 @app.post('/databases', status_code=status.HTTP_201_CREATED, responses={
     status.HTTP_409_CONFLICT: response("Database already exists", "Database 'database_name' already exists"),
 })
-def create_database(new_database: NewDatabase) -> Database:
+async def create_database(new_database: NewDatabase) -> Database:
+    global _database_names
     if new_database.name in databases:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail=f"Database '{new_database.name}' already exists")
     database = Database(name=new_database.name)
     databases[new_database.name] = database
+    _database_names = None
     return database
 
 
 @app.delete('/databases/{database_name}', status_code=status.HTTP_204_NO_CONTENT, responses={
-    status.HTTP_404_NOT_FOUND: response("Database was not found", "Cannot find database 'database_name'"),
+    status.HTTP_404_NOT_FOUND: DATABASE_NOT_FOUND,
 })
-def delete_database(database_name: str):
-    get_database(database_name)
+async def delete_database(database_name: str):
+    global _database_names
+    _resolve(database_name)
     del databases[database_name]
+    _database_names = None
 
 
-@app.get('/databases/{database_name}/tables/{table_id}', response_model_exclude_none=True, responses={
-    status.HTTP_404_NOT_FOUND: response("Database or table was not found",
-                                        database_not_found="Cannot find database 'database_name'",
-                                        table_not_found="Database 'database_name' doesn't contain table #table_id"),
+@app.get('/databases/{database_name}/tables/{table_id}', response_model=Table, responses={
+    status.HTTP_404_NOT_FOUND: TABLE_NOT_FOUND,
 })
-def get_table(database_name: str, table_id: NonNegativeInt) -> Table:
-    database = get_database(database_name)
-    try:
-        return database.tables[table_id]
-    except KeyError:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Database '{database_name}' doesn't contain table #{table_id}")
+async def get_table(database_name: str, table_id: NonNegativeInt) -> PydanticResponse:
+    _, table, _ = _resolve(database_name, table_id)
+    return PydanticResponse(table)
 
 
 class NewTable(BaseModel):
@@ -96,81 +135,71 @@ class NewTable(BaseModel):
           response_model_exclude_none=True,
           status_code=status.HTTP_201_CREATED,
           responses={
-              status.HTTP_404_NOT_FOUND: response("Database was not found", "Cannot find database 'database_name'"),
+              status.HTTP_404_NOT_FOUND: DATABASE_NOT_FOUND,
           })
-def create_table(database_name: str, new_table: NewTable) -> Table:
-    database = get_database(database_name)
+async def create_table(database_name: str, new_table: NewTable) -> Table:
+    database, _, _ = _resolve(database_name)
     return database.add_table(new_table.name, new_table.columns)
 
 
 @app.delete('/databases/{database_name}/tables/{table_id}', status_code=status.HTTP_204_NO_CONTENT, responses={
-    status.HTTP_404_NOT_FOUND: response("Database or table was not found",
-                                        database_not_found="Cannot find database 'database_name'",
-                                        table_not_found="Database 'database_name' doesn't contain table #table_id"),
+    status.HTTP_404_NOT_FOUND: TABLE_NOT_FOUND,
 })
-def delete_table(database_name: str, table_id: NonNegativeInt):
-    get_table(database_name, table_id)
-    get_database(database_name).remove_table(table_id)
+async def delete_table(database_name: str, table_id: NonNegativeInt):
+    database, _, _ = _resolve(database_name, table_id)
+    database.remove_table(table_id)
 
 
-@app.get('/databases/{database_name}/tables/{table_id}/rows', responses={
-    status.HTTP_404_NOT_FOUND: response("Database or table was not found",
-                                        database_not_found="Cannot find database 'database_name'",
-                                        table_not_found="Database 'database_name' doesn't contain table #table_id"),
+@app.get('/databases/{database_name}/tables/{table_id}/rows', response_model=dict[NonNegativeInt, Row], responses={
+    status.HTTP_404_NOT_FOUND: TABLE_NOT_FOUND,
 })
-def get_table_rows(database_name: str, table_id: NonNegativeInt) -> dict[NonNegativeInt, Row]:
-    return get_table(database_name, table_id)._rows
+async def get_table_rows(database_name: str, table_id: NonNegativeInt) -> Response:
+    _, table, _ = _resolve(database_name, table_id)
+    return Response(table.dump_rows_json(), media_type='application/json')
 
 
-@app.get('/databases/{database_name}/tables/{table_id}/rows/{row_id}', responses={
-    status.HTTP_404_NOT_FOUND: response(
-        "Database, table or row was not found",
-        database_not_found="Cannot find database 'database_name'",
-        table_not_found="Database 'database_name' doesn't contain table #table_id",
-        row_not_found="Table #table_id in database 'database_name' doesn't contain row #row_id"),
+@app.get('/databases/{database_name}/tables/{table_id}/rows/{row_id}', response_model=Row, responses={
+    status.HTTP_404_NOT_FOUND: ROW_NOT_FOUND,
 })
-def get_row(database_name: str, table_id: NonNegativeInt, row_id: NonNegativeInt) -> Row:
-    try:
-        return get_table(database_name, table_id)._rows[row_id]
-    except KeyError:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Table #{table_id} in database '{database_name}' doesn't contain row #{row_id}")
+async def get_row(database_name: str, table_id: NonNegativeInt, row_id: NonNegativeInt) -> PydanticResponse:
+    _, _, row = _resolve(database_name, table_id, row_id)
+    return PydanticResponse(row)
 
 
 class NewRow(BaseModel):
     cells: list[Value]
 
 
-@app.post('/databases/{database_name}/tables/{table_id}/rows', status_code=status.HTTP_201_CREATED, responses={
-    status.HTTP_404_NOT_FOUND: response("Database or table was not found",
-                                        database_not_found="Cannot find database 'database_name'",
-                                        table_not_found="Database 'database_name' doesn't contain table #table_id"),
-    status.HTTP_400_BAD_REQUEST: response("Invalid row",
-                                          incorrect_row_length="Row length must be the same as number of columns",
-                                          invalid_value="Type1 expected but Type2 value 'value' found"),
-})
-def create_row(database_name: str, table_id: NonNegativeInt, new_row: NewRow) -> Row:
+@app.post('/databases/{database_name}/tables/{table_id}/rows',
+          response_model=Row,
+          status_code=status.HTTP_201_CREATED,
+          responses={
+              status.HTTP_404_NOT_FOUND: TABLE_NOT_FOUND,
+              status.HTTP_400_BAD_REQUEST: response(
+                  "Invalid row",
+                  incorrect_row_length="Row length must be the same as number of columns",
+                  invalid_value="Type1 expected but Type2 value 'value' found"),
+          })
+async def create_row(database_name: str, table_id: NonNegativeInt, new_row: NewRow) -> PydanticResponse:
+    _, table, _ = _resolve(database_name, table_id)
     try:
-        return get_table(database_name, table_id).add_row(new_row.cells)
+        row = table.add_row(new_row.cells)
     except ValueError as err:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return PydanticResponse(row, status_code=status.HTTP_201_CREATED)
 
 
 @app.delete(
     '/databases/{database_name}/tables/{table_id}/rows/{row_id}',
     status_code=status.HTTP_204_NO_CONTENT, responses={
-        status.HTTP_404_NOT_FOUND: response(
-            "Database, table or row was not found",
-            database_not_found="Cannot find database 'database_name'",
-            table_not_found="Database 'database_name' doesn't contain table #table_id",
-            row_not_found="Table #table_id in database 'database_name' doesn't contain row #row_id"),
+        status.HTTP_404_NOT_FOUND: ROW_NOT_FOUND,
     })
-def delete_row(database_name: str, table_id: NonNegativeInt, row_id: NonNegativeInt):
-    get_row(database_name, table_id, row_id)
-    get_table(database_name, table_id).remove_row(row_id)
+async def delete_row(database_name: str, table_id: NonNegativeInt, row_id: NonNegativeInt):
+    _, table, _ = _resolve(database_name, table_id, row_id)
+    table.remove_row(row_id)
 
 
-@app.patch('/databases/{database_name}/tables/{table_id}/rows/{row_id}/cells/{column_id}', responses={
+@app.patch('/databases/{database_name}/tables/{table_id}/rows/{row_id}/cells/{column_id}', response_model=Row, responses={
     status.HTTP_404_NOT_FOUND: response(
         "Database, table, row or column was not found",
         database_not_found="Cannot find database 'database_name'",
@@ -179,46 +208,44 @@ def delete_row(database_name: str, table_id: NonNegativeInt, row_id: NonNegative
         column_not_found="Table #table_id in database 'database_name' doesn't contain column #column_id"),
     status.HTTP_400_BAD_REQUEST: response("Invalid value", "Type1 expected but Type2 value 'value' found"),
 })
-def update_cell_value(
+async def update_cell_value(
         database_name: str,
         table_id: NonNegativeInt,
         row_id: NonNegativeInt,
         column_id: NonNegativeInt,
-        value: Value) -> Row:
-    table = get_table(database_name, table_id, )
-    row = get_row(database_name, table_id, row_id)
+        value: Value) -> PydanticResponse:
+    _, table, row = _resolve(database_name, table_id, row_id)
     if column_id >= len(table.columns):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Table #{table_id} in database '{database_name}' doesn't contain column #{column_id}")
     try:
-        table.columns[column_id].check_value(value)
+        value = table.columns[column_id].check_value(value)
     except ValueError as err:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
-    row.cells[column_id] = value
-    return row
+    row.set_cell(column_id, value)
+    return PydanticResponse(row)
 
 
 @app.get('/databases/{database_name}/table_difference/{left_table_id}/{right_table_id}',
-         response_model_exclude_none=True,
+         response_model=TableDifference,
          responses={
-             status.HTTP_404_NOT_FOUND: response(
-                 "Database or table was not found",
-                 database_not_found="Cannot find database 'database_name'",
-                 table_not_found="Database 'database_name' doesn't contain table #table_id"),
+             status.HTTP_404_NOT_FOUND: TABLE_NOT_FOUND,
              status.HTTP_400_BAD_REQUEST: response(
                  "Tables are incompatible",
                  different_column_counts="Table difference: tables have different column counts",
                  different_column_types="Table difference: tables have different column types"),
          })
-def get_table_difference(database_name: str, left_table_id: NonNegativeInt,
-                         right_table_id: NonNegativeInt) -> TableDifference:
-    left_table = get_table(database_name, left_table_id)
-    right_table = get_table(database_name, right_table_id)
-    return left_table - right_table
+async def get_table_difference(database_name: str, left_table_id: NonNegativeInt,
+                               right_table_id: NonNegativeInt) -> PydanticResponse:
+    _, left_table, _ = _resolve(database_name, left_table_id)
+    _, right_table, _ = _resolve(database_name, right_table_id)
+    return PydanticResponse(left_table - right_table)
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Databases live in process memory, so every worker serves its own independent set of them.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.environ.get("DBMS_WORKERS", 1)))
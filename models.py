@@ -1,7 +1,8 @@
 from decimal import Decimal
 from enum import Enum
-from pydantic import BaseModel, conint, NonNegativeInt, PrivateAttr, model_validator
-from typing import Optional, Union
+from pydantic import (BaseModel, ConfigDict, conint, constr, NonNegativeInt, PrivateAttr, TypeAdapter, ValidationError,
+                      field_serializer, model_validator)
+from typing import Callable, Optional, Union
 
 
 class Color(BaseModel):
@@ -13,6 +14,14 @@ class Color(BaseModel):
 Value = Union[int, Decimal, str, Color]
 
 
+def _pack_color(color: Color) -> int:
+    return (color.r << 16) | (color.g << 8) | color.b
+
+
+def _unpack_color(packed: int) -> Color:
+    return Color.model_construct(r=packed >> 16, g=(packed >> 8) & 0xff, b=packed & 0xff)
+
+
 class Type(str, Enum):
     Integer = 'Integer'
     Real = 'Real'
@@ -22,6 +31,24 @@ class Type(str, Enum):
     ColorInvl = 'ColorInvl'
 
 
+_CHECKERS = {
+    Type.Integer: lambda value: type(value) is int,
+    Type.Real: lambda value: type(value) is int or type(value) is Decimal,
+    Type.Char: lambda value: type(value) is str and len(value) == 1,
+    Type.String: lambda value: type(value) is str,
+    Type.Color: lambda value: isinstance(value, Color),
+}
+
+_VALUE_TYPES = {
+    Type.Integer: int,
+    Type.Real: Union[int, Decimal],
+    Type.Char: constr(min_length=1, max_length=1),
+    Type.String: str,
+    Type.Color: Color,
+    Type.ColorInvl: Color,
+}
+
+
 class Column(BaseModel):
     name: str
     type: Type
@@ -31,6 +58,8 @@ class Column(BaseModel):
     g_max: Optional[conint(ge=0, le=255)] = None
     b_min: Optional[conint(ge=0, le=255)] = None
     b_max: Optional[conint(ge=0, le=255)] = None
+    _type_key: Optional[tuple] = PrivateAttr(None)
+    _check: Optional[Callable[[Value], Value]] = PrivateAttr(None)
 
     @model_validator(mode='after')
     def check(self):
@@ -45,6 +74,7 @@ class Column(BaseModel):
             if not (self.r_min is self.r_max is self.g_min is self.g_max is self.b_min is self.b_max is None):
                 raise ValueError(f'Column: if type="{self.type}", fields "r_min", "r_max", "g_min", "g_max", '
                                  f'"b_min", "b_max" must not be provided')
+        self._check = self._make_check()
         return self
 
     def type_str(self) -> str:
@@ -53,76 +83,135 @@ class Column(BaseModel):
         else:
             return f'ColorInvl (R∈[{self.r_min}..{self.r_max}], G∈[{self.g_min}..{self.g_max}], B∈[{self.b_min}..{self.b_max}])'
 
-    def check_value(self, value):
-        try:
-            if self.type == Type.Integer:
-                assert isinstance(value, int)
-            elif self.type == Type.Real:
-                assert isinstance(value, int) or isinstance(value, Decimal)
-            elif self.type == Type.Char:
-                assert isinstance(value, str) and len(value) == 1
-            elif self.type == Type.String:
-                assert isinstance(value, str)
-            elif self.type == Type.Color:
-                assert isinstance(value, Color)
-            elif self.type == Type.ColorInvl:
-                assert (isinstance(value, Color) and
-                        self.r_min <= value.r <= self.r_max and
-                        self.g_min <= value.g <= self.g_max and
-                        self.b_min <= value.b <= self.b_max)
-            else:
-                assert False
-        except AssertionError:
-            raise ValueError(f"{self.type_str()} expected but {type(value).__name__} value '{value}' found")
+    def _make_check(self) -> Callable[[Value], Value]:
+        if self.type == Type.ColorInvl:
+            r_min, r_max, g_min, g_max, b_min, b_max = \
+                self.r_min, self.r_max, self.g_min, self.g_max, self.b_min, self.b_max
+
+            def accepts(value):
+                return (isinstance(value, Color) and
+                        r_min <= value.r <= r_max and
+                        g_min <= value.g <= g_max and
+                        b_min <= value.b <= b_max)
+        else:
+            accepts = _CHECKERS[self.type]
+        expected = self.type_str()
+        packed = self.is_color()
+
+        def check(value):
+            if not accepts(value):
+                raise ValueError(f"{expected} expected but {type(value).__name__} value '{value}' found")
+            return _pack_color(value) if packed else value
+
+        return check
+
+    def is_color(self) -> bool:
+        return self.type == Type.Color or self.type == Type.ColorInvl
+
+    def check_value(self, value) -> Value:
+        return self._check(value)
+
+    def _type_tuple(self) -> tuple:
+        if self._type_key is None:
+            self._type_key = (self.type, self.r_min, self.r_max, self.g_min, self.g_max, self.b_min, self.b_max)
+        return self._type_key
 
     def get_type(self, name: str = "") -> 'Column':
-        return Column(name=name,
-                      type=self.type,
-                      r_min=self.r_min, r_max=self.r_max,
-                      g_min=self.r_min, g_max=self.r_max,
-                      b_min=self.r_min, b_max=self.r_max)
+        return Column.model_construct(name=name,
+                                      type=self.type,
+                                      r_min=self.r_min, r_max=self.r_max,
+                                      g_min=self.g_min, g_max=self.g_max,
+                                      b_min=self.b_min, b_max=self.b_max)
 
 
 class Row(BaseModel):
     id: NonNegativeInt
     cells: list[Value]
+    _colors: tuple[int, ...] = PrivateAttr(())
+    _key: Optional[tuple] = PrivateAttr(None)
+    _json: Optional[bytes] = PrivateAttr(None)
+
+    @field_serializer('cells')
+    def _unpack_cells(self, cells: list[Value]) -> list[Value]:
+        if not self._colors:
+            return cells
+        cells = list(cells)
+        for i in self._colors:
+            cells[i] = _unpack_color(cells[i])
+        return cells
+
+    def set_cell(self, index: int, value: Value):
+        self.cells[index] = value
+        self._key = None
+        self._json = None
+
+    def key(self) -> tuple:
+        if self._key is None:
+            self._key = tuple(self.cells)
+        return self._key
+
+    def dump_json(self) -> bytes:
+        if self._json is None:
+            self._json = self.model_dump_json().encode()
+        return self._json
 
 
 class Table(BaseModel):
     id: NonNegativeInt
     name: str
     columns: list[Column]
-    _rows: dict[NonNegativeInt, Row] = {}
-    _next_id: NonNegativeInt = PrivateAttr(0)
+    _rows: list[Optional[Row]] = []
+    _checkers: Optional[list[Callable[[Value], Value]]] = PrivateAttr(None)
+    _colors: Optional[tuple[int, ...]] = PrivateAttr(None)
+    _validator: Optional[TypeAdapter] = PrivateAttr(None)
 
     def add_row(self, cells: list[Value]) -> Row:
-        if len(cells) != len(self.columns):
+        if self._checkers is None:
+            self._checkers = [column._check for column in self.columns]
+            self._colors = tuple(i for i, column in enumerate(self.columns) if column.is_color())
+            self._validator = TypeAdapter(tuple[tuple(_VALUE_TYPES[column.type] for column in self.columns)],
+                                          config=ConfigDict(strict=True))
+        checkers, colors = self._checkers, self._colors
+        if len(cells) != len(checkers):
             raise ValueError("Row length must be the same as number of columns")
-        for i in range(len(self.columns)):
-            self.columns[i].check_value(cells[i])
-        row = Row(id=self._next_id, cells=cells)
-        self._rows[self._next_id] = row
-        self._next_id += 1
+        try:
+            cells = list(self._validator.validate_python(tuple(cells)))
+        except ValidationError:
+            for checker, cell in zip(checkers, cells):
+                checker(cell)
+            raise
+        for i in colors:
+            cells[i] = checkers[i](cells[i])
+        row = Row.model_construct(id=len(self._rows), cells=cells)
+        row._colors = colors
+        self._rows.append(row)
         return row
 
+    def get_row(self, id) -> Optional[Row]:
+        return self._rows[id] if 0 <= id < len(self._rows) else None
+
     def remove_row(self, id):
-        if id in self._rows:
-            del self._rows[id]
+        if 0 <= id < len(self._rows):
+            self._rows[id] = None
+
+    def dump_rows_json(self) -> bytes:
+        return b'{' + b','.join(b'"%d":%s' % (row.id, row.dump_json()) for row in self._rows if row is not None) + b'}'
 
     def contains_row(self, row) -> bool:
-        return any(row.cells == value.cells for value in self._rows.values())
+        return any(row.cells == value.cells for value in self._rows if value is not None)
 
     def __sub__(left: 'Table', right: 'Table') -> 'TableDifference':
         if len(left.columns) != len(right.columns):
             raise ValueError("Table difference: tables have different column counts")
-        if any(l.get_type() != r.get_type() for l, r in zip(left.columns, right.columns)):
+        if any(l._type_tuple() != r._type_tuple() for l, r in zip(left.columns, right.columns)):
             raise ValueError("Table difference: tables have different column types")
         columns = [l.get_type(l.name if l.name == r.name else f"'{l.name}' / '{r.name}'")
                    for l, r in zip(left.columns, right.columns)]
+        right_keys = {row.key() for row in right._rows if row is not None}
         rows = {}
-        for id, row in left._rows.items():
-            if not right.contains_row(row):
-                rows[id] = row
+        for row in left._rows:
+            if row is not None and row.key() not in right_keys:
+                rows[row.id] = row
         return TableDifference(
             left_table=left,
             right_table=right,
@@ -137,14 +226,13 @@ class Database(BaseModel):
     _next_id: NonNegativeInt = PrivateAttr(0)
 
     def add_table(self, name: str, columns: list[Column]):
-        table = Table(id=self._next_id, name=name, columns=columns)
+        table = Table.model_construct(id=self._next_id, name=name, columns=columns)
         self.tables[self._next_id] = table
         self._next_id += 1
         return table
 
     def remove_table(self, id):
-        if id in self.tables:
-            del self.tables[id]
+        self.tables.pop(id, None)
 
 
 class TableDifference(BaseModel):